@@ -2,9 +2,14 @@
 Gradio UI für den Keyword Agent (Google ADK).
 """
 
+import builtins
+import contextlib
+import functools
+import json
 import gradio as gr
-import asyncio
+import orjson
 import pandas as pd
+import re
 import altair as alt
 from dotenv import load_dotenv
 from google.genai import types
@@ -24,7 +29,11 @@ def _safe_json_load(value):
     if isinstance(value, dict):
         return value
     if isinstance(value, str):
-        import json
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            pass
+        # Fallback: stdlib ist toleranter (z.B. NaN/Infinity)
         try:
             return json.loads(value)
         except Exception:
@@ -32,15 +41,47 @@ def _safe_json_load(value):
     return None
 
 
+# Entfernt nur eine Markdown-Fence ganz am Anfang (```/```python) und ganz am
+# Ende (```) des Agenten-Codes. Fences im Inneren (auch in String-Literalen)
+# bleiben erhalten; eine schließende Fence wird auch ohne öffnende entfernt.
+_FENCE_RE = re.compile(r"^```(?:python)?\s*|\s*```$", re.DOTALL)
+
+
 def _clean_code(code_str: str) -> str:
     if not isinstance(code_str, str):
         return ""
-    cleaned = code_str.strip()
-    if cleaned.startswith("```python"):
-        cleaned = cleaned.replace("```python", "").replace("```", "").strip()
-    elif cleaned.startswith("```"):
-        cleaned = cleaned.replace("```", "").strip()
-    return cleaned
+    return _FENCE_RE.sub("", code_str.strip()).strip()
+
+
+# Diagramm-Code des Agenten läuft mit einer Whitelist an Builtins und darf nur
+# altair/pandas/numpy importieren. Das ist KEINE Sandbox: über die übergebenen Module
+# (z.B. pd.io.common.os) bleibt das System erreichbar. Die Whitelist hält nur
+# offensichtliche Builtins wie open/eval/exec aus generiertem Code heraus.
+_ERLAUBTE_MODULE = {"altair", "pandas", "numpy"}
+_ERLAUBTE_BUILTINS = [
+    "abs", "all", "any", "bool", "callable", "dict", "divmod", "enumerate", "filter", "float",
+    "format", "frozenset", "getattr", "hasattr", "int", "isinstance", "issubclass", "iter",
+    "len", "list", "map", "max", "min", "next", "object", "pow", "print", "property", "range",
+    "repr", "reversed", "round", "set", "slice", "sorted", "str", "sum", "super", "tuple",
+    "type", "zip", "True", "False", "None", "__build_class__",
+    "Exception", "AttributeError", "ImportError", "IndexError", "KeyError", "NameError",
+    "StopIteration", "TypeError", "ValueError", "ZeroDivisionError",
+]
+
+
+def _chart_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split(".")[0] not in _ERLAUBTE_MODULE:
+        raise ImportError(f"Import von '{name}' im Diagramm-Code nicht erlaubt.")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+_CHART_BUILTINS = {name: getattr(builtins, name) for name in _ERLAUBTE_BUILTINS}
+_CHART_BUILTINS["__import__"] = _chart_import
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_chart(src: str):
+    return compile(src, "<agent-chart>", "exec")
 
 
 def _build_df_top(seo_ergebnis: dict) -> pd.DataFrame:
@@ -54,23 +95,23 @@ def _build_df_top(seo_ergebnis: dict) -> pd.DataFrame:
     return df[cols]
 
 
+# Gemeinsamer leerer DataFrame für Fehler- und Reset-Ausgaben (wird nur gelesen)
+_EMPTY_DF = pd.DataFrame()
+
+
 def _make_error_outputs(msg: str):
-    return (
-        f"*{msg}*",
-        pd.DataFrame(),
-        None,
-        "",
-        "",
-        "",
-        "",
-        f"*{msg}*",
-    )
+    m = f"*{msg}*"
+    return (m, _EMPTY_DF, None, "", "", "", "", m)
 
 
 # ============================================================================
 # Async Runner
 # ============================================================================
 
+# State-Keys, deren Agenten JSON ausgeben
+_JSON_KEYS = {"validierte_eingabe", "seo_ergebnis"}
+
+
 async def run_keyword_agent_async(thema: str, artikeltext: str, alter_min: int, alter_max: int):
     session = await root_runner.session_service.create_session(
         user_id="user",
@@ -92,29 +133,62 @@ alter_max: {alter_max}
         new_message=content
     )
 
+    # Nach jedem State-Update den bisherigen Stand liefern (für Streaming in der UI).
+    # JSON-Ausgaben werden direkt beim Eintreffen geparst.
     results = {}
-    async for event in events_async:
-        if event.actions and event.actions.state_delta:
-            results.update(event.actions.state_delta)
-
-    return results
-
-
-async def process_request_async(thema: str, artikeltext: str, alter_min: int, alter_max: int):
-    if not str(thema).strip():
-        return _make_error_outputs("Bitte ein Thema eingeben.")
-
     try:
-        alter_min = int(alter_min)
-        alter_max = int(alter_max)
+        async with contextlib.aclosing(events_async):
+            async for event in events_async:
+                if not (event.actions and event.actions.state_delta):
+                    continue
+
+                for key, value in event.actions.state_delta.items():
+                    parsed = _safe_json_load(value) if key in _JSON_KEYS else None
+                    results[key] = parsed if parsed is not None else value
+                yield results
+
+                # Ungültige Eingabe: restliche LLM-Stufen gar nicht erst ausführen
+                validierte_eingabe = results.get("validierte_eingabe")
+                if isinstance(validierte_eingabe, dict) and validierte_eingabe.get("gueltig") is False:
+                    break
+    finally:
+        # Session (inkl. aller Events) wird nach dem Lauf nicht mehr gebraucht;
+        # ohne Löschen sammelt der InMemory-Service sie pro Klick an.
+        await root_runner.session_service.delete_session(
+            app_name="keyword_agent",
+            user_id="user",
+            session_id=session.id,
+        )
+
+
+# Zwischenstatus je Pipeline-Stufe (in Reihenfolge der Pipeline)
+_STUFEN_STATUS = [
+    ("seo_ergebnis", "*Bewertung fertig – erstelle Diagramm und Zusammenfassung…*"),
+    ("trend_daten", "*Trenddaten geladen – bewerte Keywords…*"),
+    ("keyword_kandidaten", "*Keyword-Kandidaten erstellt – hole Trenddaten…*"),
+    ("validierte_eingabe", "*Eingabe geprüft – erstelle Keyword-Kandidaten…*"),
+]
+
+
+def _build_chart(diagramm_code: str, df_top: pd.DataFrame):
+    if not diagramm_code or df_top.empty:
+        return None
+    try:
+        namespace = {
+            "__builtins__": _CHART_BUILTINS,
+            "__name__": "<agent-chart>",  # für class-Definitionen (__module__)
+            "alt": alt,
+            "pd": pd,
+            "df": df_top,
+        }
+        exec(_compile_chart(diagramm_code), namespace)
+        return namespace.get("chart")
     except Exception:
-        return _make_error_outputs("Alterswerte müssen ganze Zahlen sein.")
-
-    if alter_min < 0 or alter_max < 0 or alter_min > alter_max:
-        return _make_error_outputs("Bitte einen gültigen Altersbereich angeben (min <= max, beide >= 0).")
+        return None
 
-    results = await run_keyword_agent_async(thema.strip(), artikeltext or "", alter_min, alter_max)
 
+def _build_outputs(results: dict, fertig: bool, chart_memo: dict):
+    """chart_memo: pro Lauf geteilt, damit das Diagramm nur einmal gebaut wird."""
     validierte_eingabe = _safe_json_load(results.get("validierte_eingabe"))
     if isinstance(validierte_eingabe, dict) and validierte_eingabe.get("gueltig") is False:
         return _make_error_outputs(validierte_eingabe.get("fehlermeldung") or "Eingabe ungültig.")
@@ -128,27 +202,58 @@ async def process_request_async(thema: str, artikeltext: str, alter_min: int, al
     vorspann = seo_ergebnis.get("vorspann", "")
 
     zusammenfassung = results.get("zusammenfassung", "")
-    zusammenfassung_md = zusammenfassung if zusammenfassung else "*Keine Zusammenfassung verfügbar.*"
+    if zusammenfassung:
+        zusammenfassung_md = zusammenfassung
+    elif fertig:
+        zusammenfassung_md = "*Keine Zusammenfassung verfügbar.*"
+    else:
+        zusammenfassung_md = "*Zusammenfassung wird erstellt…*"
+
+    # Neu bauen nur, wenn sich Code oder seo_ergebnis (gleiches Objekt im State) geändert haben
+    diagramm_code = results.get("diagramm_code", "")
+    seo_roh = results.get("seo_ergebnis")
+    if chart_memo.get("code") != diagramm_code or chart_memo.get("seo") is not seo_roh:
+        chart_memo.update(
+            code=diagramm_code,
+            seo=seo_roh,
+            chart=_build_chart(_clean_code(diagramm_code), df_top),
+        )
+    chart = chart_memo["chart"]
+
+    if fertig:
+        trends_flag = seo_ergebnis.get("trends_verfuegbar", None)
+        status = "*Fertig.*" if trends_flag is not False else "*Fertig (Trenddaten nicht verfügbar).*"
+    else:
+        status = next((s for key, s in _STUFEN_STATUS if key in results), "*Prüfe Eingabe…*")
 
-    chart = None
-    diagramm_code = _clean_code(results.get("diagramm_code", ""))
+    return status, df_top, chart, seo_titel, meta, hook, vorspann, zusammenfassung_md
 
-    if diagramm_code and not df_top.empty:
-        try:
-            namespace = {"alt": alt, "pd": pd, "df": df_top, "daten": df_top.to_dict(orient="records")}
-            exec(diagramm_code, namespace)
-            chart = namespace.get("chart")
-        except Exception:
-            chart = None
 
-    trends_flag = seo_ergebnis.get("trends_verfuegbar", None)
-    status = "*Fertig.*" if trends_flag is not False else "*Fertig (Trenddaten nicht verfügbar).*"
+async def process_request_async(thema: str, artikeltext: str, alter_min: int, alter_max: int):
+    """Async-Generator: Gradio rendert jedes Zwischenergebnis sofort."""
+    if not str(thema).strip():
+        yield _make_error_outputs("Bitte ein Thema eingeben.")
+        return
 
-    return status, df_top, chart, seo_titel, meta, hook, vorspann, zusammenfassung_md
+    try:
+        alter_min = int(alter_min)
+        alter_max = int(alter_max)
+    except Exception:
+        yield _make_error_outputs("Alterswerte müssen ganze Zahlen sein.")
+        return
+
+    if alter_min < 0 or alter_max < 0 or alter_min > alter_max:
+        yield _make_error_outputs("Bitte einen gültigen Altersbereich angeben (min <= max, beide >= 0).")
+        return
+
+    results = {}
+    chart_memo = {}
+    yield _build_outputs(results, fertig=False, chart_memo=chart_memo)
 
+    async for results in run_keyword_agent_async(thema.strip(), artikeltext or "", alter_min, alter_max):
+        yield _build_outputs(results, fertig=False, chart_memo=chart_memo)
 
-def process_request(thema: str, artikeltext: str, alter_min: int, alter_max: int):
-    return asyncio.run(process_request_async(thema, artikeltext, alter_min, alter_max))
+    yield _build_outputs(results, fertig=True, chart_memo=chart_memo)
 
 
 # ============================================================================
@@ -190,13 +295,13 @@ Du bekommst Top-Keywords + SEO-Texte + Diagramm + Kurz-Zusammenfassung.
     zusammenfassung_output = gr.Markdown(value="*Warte auf Eingabe…*")
 
     generieren_btn.click(
-        fn=process_request,
+        fn=process_request_async,
         inputs=[thema_input, artikeltext_input, alter_min_input, alter_max_input],
         outputs=[status_output, keywords_df_output, chart_output, seo_titel_output, meta_output, hook_output, vorspann_output, zusammenfassung_output],
     )
 
     reset_btn.click(
-        fn=lambda: ("*Warte auf Eingabe…*", pd.DataFrame(), None, "", "", "", "", "*Warte auf Eingabe…*"),
+        fn=lambda: ("*Warte auf Eingabe…*", _EMPTY_DF, None, "", "", "", "", "*Warte auf Eingabe…*"),
         inputs=None,
         outputs=[status_output, keywords_df_output, chart_output, seo_titel_output, meta_output, hook_output, vorspann_output, zusammenfassung_output],
     )
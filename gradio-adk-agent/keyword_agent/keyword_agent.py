@@ -6,24 +6,27 @@ Pipeline:
 2) Keyword-Kandidaten (30)
 3) Trend-Anreicherung (Tool: get_trend_daten_fuer_keywords)
 4) Auswahl + Bewertung (Top 10) + SEO-Texte
-5) Visualisierung (Altair Code)
-6) Zusammenfassung
+5) Visualisierung (Altair Code)   } parallel
+6) Zusammenfassung                }
 """
 
 from google.adk.agents.llm_agent import LlmAgent
+from google.adk.agents.parallel_agent import ParallelAgent
 from google.adk.agents.sequential_agent import SequentialAgent
 from google.adk.runners import InMemoryRunner
 
 from keyword_agent.tools import get_trend_daten_fuer_keywords
 
 GEMINI_MODEL = "gemini-2.5-flash"
+# Kleineres, schnelleres Modell für Stufen mit kurzer, strukturierter Ausgabe
+FAST_MODEL = "gemini-2.5-flash-lite"
 
 
 # ============================================================================
 # 1) Eingabeprüfung
 # ============================================================================
 eingabe_pruefung_agent = LlmAgent(
-    model=GEMINI_MODEL,
+    model=FAST_MODEL,
     name="eingabe_pruefung_agent",
     description="Prüft Thema, Text und Altersbereich und normalisiert die Eingaben.",
     instruction="""
@@ -234,7 +237,7 @@ Constraints:
 # 5) Visualisierung (Altair Code)
 # ============================================================================
 visualisierungs_agent = LlmAgent(
-    model=GEMINI_MODEL,
+    model=FAST_MODEL,
     name="visualisierungs_agent",
     description="Erstellt ein Altair-Diagramm (Python-Code) für Keyword-Scores.",
     instruction="""
@@ -255,9 +258,15 @@ HARD CONSTRAINTS:
 - Muss enthalten:
   - import altair as alt
   - import pandas as pd
+- Importiere NUR altair, pandas und numpy (andere Imports schlagen fehl)
 - Das finale Chart muss in einer Variable 'chart' gespeichert sein
 - width 400-600, height 300-400
 
+Daten:
+- Beim Ausführen existiert bereits ein pandas DataFrame 'df' mit den top_keywords
+  (Spalten u.a. keyword, gesamt_score, trend_index, suchvolumen).
+- Verwende ausschließlich 'df' als Datenquelle, keine eigenen Daten-Literale.
+
 Tooltips:
 - keyword, gesamt_score
 - optional trend_index, suchvolumen (wenn vorhanden)
@@ -272,7 +281,7 @@ Tooltips:
 # 6) Zusammenfassung (2-4 Sätze)
 # ============================================================================
 zusammenfassung_agent = LlmAgent(
-    model=GEMINI_MODEL,
+    model=FAST_MODEL,
     name="zusammenfassung_agent",
     description="Erstellt eine kurze Zusammenfassung der Ergebnisse (2-4 Sätze).",
     instruction="""
@@ -298,9 +307,11 @@ Output NUR Text.
 
 
 # ============================================================================
-# Insight Pipeline: Visualisierung → Zusammenfassung
+# Insight Pipeline: Visualisierung + Zusammenfassung (parallel)
 # ============================================================================
-insight_pipeline = SequentialAgent(
+# Beide lesen nur {seo_ergebnis} und schreiben getrennte output_keys
+# (diagramm_code, zusammenfassung) -> keine Abhängigkeit, parallel ausführbar.
+insight_pipeline = ParallelAgent(
     name="insight_pipeline",
     sub_agents=[visualisierungs_agent, zusammenfassung_agent],
     description="Erzeugt Diagramm-Code und Kurz-Zusammenfassung.",
@@ -312,7 +323,7 @@ insight_pipeline = SequentialAgent(
 # ============================================================================
 root_agent = SequentialAgent(
     name="keyword_pipeline",
-    description="Prüfung → Keywords → Trends → Bewertung+SEO → Diagramm → Zusammenfassung",
+    description="Prüfung → Keywords → Trends → Bewertung+SEO → Diagramm + Zusammenfassung",
     sub_agents=[
         eingabe_pruefung_agent,
         keyword_generierung_agent,
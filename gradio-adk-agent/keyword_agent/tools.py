@@ -16,8 +16,18 @@ Wir geben daher:
 
 from __future__ import annotations
 
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Optional, Tuple
+import asyncio
+import json
 import re
+import sqlite3
+import threading
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 # -----------------------------
@@ -30,41 +40,309 @@ def _normalisiere_keyword(keyword: str) -> str:
 
 
 def _dedupe_preserve_order(items: List[str]) -> List[str]:
-    seen = set()
-    out = []
-    for x in items:
-        if x not in seen:
-            out.append(x)
-            seen.add(x)
-    return out
+    return list(dict.fromkeys(items))
 
 
 # Optional: sehr grober Brand-Safety Filter (nur als zusätzliche Sicherung)
 # (Der eigentliche Brand-Safety-Check sollte in den Agenten-Instructions passieren.)
-_VERBOTENE_MUSTER = [
-    r"\b(kokain|heroin|meth|crystal|drogen kaufen)\b",
-    r"\b(waffe kaufen|schusswaffe|bombenbau)\b",
-    r"\b(kindesmissbrauch)\b",
+# Begriffe gelten als ganze Wörter (Wortgrenzen wie \b), z.B. "meth" ≠ "methode".
+_VERBOTENE_BEGRIFFE = [
+    "kokain", "heroin", "meth", "crystal", "drogen kaufen",
+    "waffe kaufen", "schusswaffe", "bombenbau",
+    "kindesmissbrauch",
 ]
 
+# Einmal beim Import zu einem Muster kombiniert: ein Suchlauf pro Keyword.
+_VERBOTEN_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(b) for b in _VERBOTENE_BEGRIFFE) + r")\b", re.IGNORECASE
+)
+
+# Aho-Corasick-Automat (pyahocorasick): Laufzeit O(len(keyword)) unabhängig von
+# der Anzahl Begriffe. Fehlt das Paket (z.B. ohne Build-Tools), greift die Regex.
+try:
+    import ahocorasick  # type: ignore
+except ImportError:
+    ahocorasick = None
+
+
+def _baue_automat(begriffe: List[str]):
+    automat = ahocorasick.Automaton()
+    for begriff in begriffe:
+        wort = begriff.lower()
+        automat.add_word(wort, len(wort))
+    automat.make_automaton()
+    return automat
+
+
+_VERBOTEN_AUTOMAT = _baue_automat(_VERBOTENE_BEGRIFFE) if ahocorasick is not None else None
+
+
+def _ist_wortzeichen(text: str, pos: int) -> bool:
+    return 0 <= pos < len(text) and (text[pos].isalnum() or text[pos] == "_")
+
 
 def brand_safety_ok(keyword: str) -> bool:
+    if _VERBOTEN_AUTOMAT is None:
+        return _VERBOTEN_RE.search(keyword) is None
+
     k = keyword.lower()
-    for pat in _VERBOTENE_MUSTER:
-        if re.search(pat, k):
+    for ende, laenge in _VERBOTEN_AUTOMAT.iter(k):
+        start = ende - laenge + 1
+        if not _ist_wortzeichen(k, start - 1) and not _ist_wortzeichen(k, ende + 1):
             return False
     return True
 
 
+def brand_safety_mask(words: List[str]) -> List[bool]:
+    """Brand-Safety für viele Strings auf einmal (True = unbedenklich)."""
+    return [brand_safety_ok(w) for w in words]
+
+
+def _clean_queries(series: pd.Series, n: Optional[int] = None) -> List[str]:
+    """Normalisiert, filtert und dedupliziert Suchanfragen in einem Durchlauf."""
+    s = series.str.strip().str.replace(r"\s+", " ", regex=True).dropna()
+    s = s[s != ""]
+    s = s[brand_safety_mask(s.tolist())].drop_duplicates()
+    return (s if n is None else s.head(n)).tolist()
+
+
+# -----------------------------
+# Trends-Cache (SQLite, mit TTL)
+# -----------------------------
+# Trendabfragen sind seiteneffektfrei: Ergebnisse je (Land, Zeitraum, Sprache,
+# Keyword) werden sitzungsübergreifend gecacht, damit wiederholte Keywords kein
+# weiteres Google-Request (und kein 429-Risiko) auslösen.
+CACHE_PFAD = Path.home() / ".cache" / "keyword_agent_trends.sqlite3"
+CACHE_TTL_SEKUNDEN = 24 * 60 * 60
+
+_cache_lock = threading.Lock()
+_cache_conn: Optional[sqlite3.Connection] = None
+_cache_deaktiviert = False
+
+
+def _cache_schluessel(land: str, zeitraum: str, sprache: str, keyword: str) -> str:
+    return f"{land}|{zeitraum}|{sprache}|{keyword}"
+
+
+def _cache_verbindung() -> Optional[sqlite3.Connection]:
+    """Öffnet den Cache beim ersten Zugriff; ohne Schreibrechte bleibt er aus."""
+    global _cache_conn, _cache_deaktiviert
+    if _cache_conn is None and not _cache_deaktiviert:
+        try:
+            CACHE_PFAD.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(CACHE_PFAD, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trends ("
+                "schluessel TEXT PRIMARY KEY, wert TEXT NOT NULL, ablauf REAL NOT NULL)"
+            )
+            _cache_conn = conn
+        except (OSError, sqlite3.Error):
+            _cache_deaktiviert = True
+    return _cache_conn
+
+
+def _cache_lesen(schluessel: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Liefert alle nicht abgelaufenen Einträge zu den Schlüsseln."""
+    with _cache_lock:
+        conn = _cache_verbindung()
+        if conn is None or not schluessel:
+            return {}
+        try:
+            platzhalter = ",".join("?" * len(schluessel))
+            rows = conn.execute(
+                f"SELECT schluessel, wert FROM trends WHERE ablauf > ? AND schluessel IN ({platzhalter})",
+                [time.time(), *schluessel],
+            ).fetchall()
+        except sqlite3.Error:
+            return {}
+    return {k: json.loads(v) for k, v in rows}
+
+
+def _cache_schreiben(eintraege: Dict[str, Dict[str, Any]]) -> None:
+    with _cache_lock:
+        conn = _cache_verbindung()
+        if conn is None or not eintraege:
+            return
+        ablauf = time.time() + CACHE_TTL_SEKUNDEN
+        try:
+            with conn:
+                conn.execute("DELETE FROM trends WHERE ablauf <= ?", (time.time(),))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO trends (schluessel, wert, ablauf) VALUES (?, ?, ?)",
+                    [(k, json.dumps(v, ensure_ascii=False), ablauf) for k, v in eintraege.items()],
+                )
+        except sqlite3.Error:
+            pass
+
+
 # -----------------------------
 # Google Trends Tool (pytrends)
 # -----------------------------
-def get_trend_daten_fuer_keywords(
+# Batch-Größe: 5 ist erfahrungsgemäß stabil
+BATCH_SIZE = 5
+
+# Batches laufen parallel im Thread-Pool (pytrends ist blockierend).
+# Jeder Batch hält zwei Google-Sessions gleichzeitig (interest_over_time und
+# related_queries, siehe _related_pool). Die Pool-Größe begrenzt daher modulweit
+# – auch über gleichzeitige Tool-Aufrufe hinweg – auf 2 Batches = max. 4
+# Requests im Flug, damit Google nicht drosselt. Beide Pools sind gleich groß,
+# so entstehen höchstens 4 TrendReq-Instanzen (je ein Cookie-Abruf pro Thread).
+MAX_PARALLELE_BATCHES = 2
+_trends_pool = ThreadPoolExecutor(max_workers=MAX_PARALLELE_BATCHES, thread_name_prefix="pytrends")
+
+# related_queries eines Batches läuft in einem eigenen Pool parallel zu
+# interest_over_time (eigene TrendReq-Instanz pro Thread, gleicher Payload).
+_related_pool = ThreadPoolExecutor(max_workers=MAX_PARALLELE_BATCHES, thread_name_prefix="pytrends-related")
+
+# Eine TrendReq-Instanz je Worker-Thread: Session + Cookies werden über
+# Aufrufe hinweg wiederverwendet, ohne Instanzen zwischen Threads zu teilen.
+_tls = threading.local()
+
+# Bei Drosselung kann Google Requests sehr lange hängen lassen. pytrends nutzt
+# standardmäßig schon timeout=(2, 5); wir behalten diese Werte (connect, read)
+# und erlauben eine Wiederholung – aber nur, solange das Gesamtbudget des
+# Batches (Cookie, Payload, Daten-Request) dafür noch reicht.
+TRENDS_TIMEOUT = (2, 5)
+TRENDS_RETRIES = 1
+TRENDS_BACKOFF_SEKUNDEN = 0.2
+TRENDS_BATCH_DEADLINE_SEKUNDEN = 12
+
+
+def _get_pytrends(sprache: str):
+    from pytrends.request import TrendReq  # type: ignore
+
+    if getattr(_tls, "pt", None) is None or _tls.lang != sprache:
+        _tls.pt = TrendReq(hl=sprache, tz=360, timeout=TRENDS_TIMEOUT)
+        _tls.lang = sprache
+    return _tls.pt
+
+
+def _mit_retry(deadline: float, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Ruft fn auf und wiederholt bei Timeout.
+
+    Ein Versuch startet nur, wenn bis zur deadline (time.monotonic()) noch ein
+    kompletter Request (connect + read) Platz hat; sonst wird Timeout ausgelöst.
+    """
+    from requests.exceptions import Timeout
+
+    for versuch in range(TRENDS_RETRIES + 1):
+        if time.monotonic() + sum(TRENDS_TIMEOUT) > deadline:
+            raise Timeout("Zeitbudget für den Trends-Batch aufgebraucht")
+        try:
+            return fn(*args, **kwargs)
+        except Timeout:
+            if versuch == TRENDS_RETRIES:
+                raise
+            time.sleep(TRENDS_BACKOFF_SEKUNDEN * 2**versuch)
+
+
+def _hole_related(batch: List[str], land: str, zeitraum: str, sprache: str) -> Dict[str, Any]:
+    """Related queries für einen Batch; läuft im _related_pool."""
+    deadline = time.monotonic() + TRENDS_BATCH_DEADLINE_SEKUNDEN
+    pytrends = _mit_retry(deadline, _get_pytrends, sprache)
+    _mit_retry(deadline, pytrends.build_payload, batch, timeframe=zeitraum, geo=land)
+    return _mit_retry(deadline, pytrends.related_queries)  # dict: {keyword: {"top": df, "rising": df}}
+
+
+def _leeres_ergebnis(keyword: str) -> Dict[str, Any]:
+    return {
+        "keyword": keyword,
+        "trend_index": None,
+        "suchvolumen": None,
+        "verwandte_suchanfragen": [],
+    }
+
+
+def _verarbeite_batch(
+    batch: List[str],
+    land: str,
+    zeitraum: str,
+    sprache: str,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Holt Trenddaten für einen Batch (max. BATCH_SIZE Keywords).
+
+    verwandte_suchanfragen werden ungekürzt geliefert (so auch gecacht);
+    auf max_verwandte wird erst beim Zurückgeben des Tools gekürzt.
+
+    Läuft in einem Worker-Thread mit dessen TrendReq-Instanz, da pytrends
+    den Payload-Zustand im Objekt hält.
+
+    Returns:
+        (ergebnisse, cachebar) – cachebar ist False, wenn ein Request in den
+        Timeout lief und die Ergebnisse daher unvollständig sind.
+    """
+    import pandas as pd
+    from requests.exceptions import Timeout
+
+    # 2) Related queries sofort anstoßen, damit beide Requests überlappen
+    related_future = _related_pool.submit(_hole_related, batch, land, zeitraum, sprache)
+
+    deadline = time.monotonic() + TRENDS_BATCH_DEADLINE_SEKUNDEN
+    try:
+        # Erster Aufruf pro Thread holt ein Google-Cookie (HTTP) -> ebenfalls mit Timeout/Retry
+        pytrends = _mit_retry(deadline, _get_pytrends, sprache)
+        _mit_retry(deadline, pytrends.build_payload, batch, timeframe=zeitraum, geo=land)
+
+        # 1) Interest over time -> wir reduzieren auf einen Proxy-Index:
+        #    z.B. Maximum über Zeitraum oder Mittelwert (hier: Mittelwert).
+        iot = _mit_retry(deadline, pytrends.interest_over_time)
+    except Timeout:
+        related_future.cancel()
+        return [_leeres_ergebnis(kw) for kw in batch], False
+
+    # iot enthält Spalten je Keyword + evtl. isPartial -> Mittelwerte aller Spalten in einem Schritt
+    means = iot.drop(columns=["isPartial"], errors="ignore").mean(skipna=True).round().astype("Int64")
+
+    # Bei leerem IoT gibt es auch keine related queries -> nicht darauf warten
+    cachebar = True
+    if iot.empty:
+        related_future.cancel()
+        related = {}
+    else:
+        try:
+            related = related_future.result()
+        except Timeout:
+            related, cachebar = {}, False
+
+    ergebnisse: List[Dict[str, Any]] = []
+    for kw in batch:
+        # Proxy: Durchschnitt (0-100)
+        trend_index: Optional[int] = int(means[kw]) if kw in means and pd.notna(means[kw]) else None
+
+        verwandte: List[str] = []
+        try:
+            rq = related.get(kw, {})
+
+            # Wir nehmen zuerst rising, dann top (oder andersrum).
+            queries = [
+                df["query"] for df in (rq.get("rising"), rq.get("top")) if df is not None and not df.empty
+            ]
+            if queries:
+                verwandte = _clean_queries(pd.concat(queries, ignore_index=True))
+        except Exception:
+            verwandte = []
+
+        ergebnisse.append(
+            {
+                "keyword": kw,
+                "trend_index": trend_index,
+                "suchvolumen": None,
+                "verwandte_suchanfragen": verwandte,
+            }
+        )
+
+    return ergebnisse, cachebar
+
+
+async def get_trend_daten_fuer_keywords(
     keywords: List[str],
     land: str = "DE",
     zeitraum: str = "today 12-m",
     sprache: str = "de-DE",
     max_verwandte: int = 5,
+    force_refresh: bool = False,
 ) -> Dict[str, Any]:
     """
     ADK Tool: Holt Trenddaten (Proxy-Index) und verwandte Suchanfragen.
@@ -75,6 +353,7 @@ def get_trend_daten_fuer_keywords(
         zeitraum: z.B. "today 12-m", "today 3-m", "today 5-y"
         sprache: z.B. "de-DE"
         max_verwandte: wie viele related queries max.
+        force_refresh: Cache ignorieren und Trends neu abfragen.
 
     Returns:
         {
@@ -102,87 +381,62 @@ def get_trend_daten_fuer_keywords(
             "hinweis": "Keine gültigen Keywords für Trends-Abfrage vorhanden.",
         }
 
+    # Cache-Treffer vorab abziehen; nur Fehlende gehen an pytrends.
+    schluessel = {k: _cache_schluessel(land, zeitraum, sprache, k) for k in cleaned}
+    treffer: Dict[str, Dict[str, Any]] = {}
+    if not force_refresh:
+        # SQLite-I/O im Thread, damit der Event-Loop (ADK/Gradio) frei bleibt
+        cache = await asyncio.to_thread(_cache_lesen, list(schluessel.values()))
+        treffer = {k: cache[key] for k, key in schluessel.items() if key in cache}
+    fehlend = [k for k in cleaned if k not in treffer]
+
+    def _gekuerzt(eintrag: Dict[str, Any]) -> Dict[str, Any]:
+        return {**eintrag, "verwandte_suchanfragen": eintrag["verwandte_suchanfragen"][:max_verwandte]}
+
     # pytrends kann pro Request nur eine begrenzte Anzahl Keywords sinnvoll handeln.
-    # Wir machen es robust: batchweise und aggregieren.
+    # Wir machen es robust: batchweise (parallel) und aggregieren.
     try:
-        from pytrends.request import TrendReq  # type: ignore
-        import pandas as pd  # noqa: F401
-
-        pytrends = TrendReq(hl=sprache, tz=360)
-
-        ergebnisse: List[Dict[str, Any]] = []
-
-        # Batch-Größe: 5 ist erfahrungsgemäß stabil
-        BATCH_SIZE = 5
-        for i in range(0, len(cleaned), BATCH_SIZE):
-            batch = cleaned[i : i + BATCH_SIZE]
-            pytrends.build_payload(batch, timeframe=zeitraum, geo=land)
-
-            # 1) Interest over time -> wir reduzieren auf einen Proxy-Index:
-            #    z.B. Maximum über Zeitraum oder Mittelwert (hier: Mittelwert).
-            iot = pytrends.interest_over_time()
-            # iot enthält Spalten je Keyword + evtl. isPartial
-
-            # 2) Related queries
-            related = pytrends.related_queries()  # dict: {keyword: {"top": df, "rising": df}}
-
-            for kw in batch:
-                trend_index: Optional[int] = None
-                try:
-                    if kw in iot.columns:
-                        series = iot[kw].dropna()
-                        if len(series) > 0:
-                            # Proxy: Durchschnitt (0-100)
-                            trend_index = int(round(float(series.mean())))
-                except Exception:
-                    trend_index = None
-
-                verwandte: List[str] = []
-                try:
-                    rq = related.get(kw, {})
-                    top_df = rq.get("top")
-                    rising_df = rq.get("rising")
-
-                    # Wir nehmen zuerst rising, dann top (oder andersrum).
-                    if rising_df is not None and not rising_df.empty:
-                        verwandte += rising_df["query"].head(max_verwandte).tolist()
-                    if top_df is not None and not top_df.empty and len(verwandte) < max_verwandte:
-                        needed = max_verwandte - len(verwandte)
-                        verwandte += top_df["query"].head(needed).tolist()
-
-                    verwandte = [_normalisiere_keyword(x) for x in verwandte if isinstance(x, str)]
-                    verwandte = [x for x in verwandte if x and brand_safety_ok(x)]
-                    verwandte = _dedupe_preserve_order(verwandte)
-                except Exception:
-                    verwandte = []
-
-                ergebnisse.append(
-                    {
-                        "keyword": kw,
-                        "trend_index": trend_index,
-                        "suchvolumen": None,
-                        "verwandte_suchanfragen": verwandte,
-                    }
-                )
+        batches = [fehlend[i : i + BATCH_SIZE] for i in range(0, len(fehlend), BATCH_SIZE)]
+
+        # Nebenläufigkeit begrenzt _trends_pool; gather erhält die Reihenfolge der Batches
+        loop = asyncio.get_running_loop()
+        batch_ergebnisse = await asyncio.gather(
+            *[
+                loop.run_in_executor(_trends_pool, _verarbeite_batch, batch, land, zeitraum, sprache)
+                for batch in batches
+            ]
+        )
+        frisch = {e["keyword"]: e for batch, _ in batch_ergebnisse for e in batch}
+        # Batches mit Timeout nicht cachen, damit der nächste Lauf es erneut versucht
+        await asyncio.to_thread(
+            _cache_schreiben,
+            {schluessel[e["keyword"]]: e for batch, cachebar in batch_ergebnisse if cachebar for e in batch},
+        )
+
+        # Reihenfolge der Eingabe beibehalten
+        ergebnisse: List[Dict[str, Any]] = [_gekuerzt(treffer.get(k) or frisch[k]) for k in cleaned]
+
+        hinweis = "trend_index ist ein Proxy (0-100) aus Google Trends; echtes Suchvolumen ist hier nicht enthalten."
+        unvollstaendig = [batch for batch, cachebar in batch_ergebnisse if not cachebar]
+        fehlgeschlagen = [b for b in unvollstaendig if all(e["trend_index"] is None for e in b)]
+        if unvollstaendig:
+            hinweis += (
+                f" {len(unvollstaendig)} von {len(batches)} Trends-Abfragen liefen in einen Timeout;"
+                " betroffene Keywords haben keine oder unvollständige Trenddaten."
+            )
 
         return {
-            "trends_verfuegbar": True,
+            # Nur wenn wirklich jede Abfrage gescheitert ist, gelten Trends als nicht verfügbar
+            "trends_verfuegbar": not (batches and len(fehlgeschlagen) == len(batches)),
             "ergebnisse": ergebnisse,
-            "hinweis": "trend_index ist ein Proxy (0-100) aus Google Trends; echtes Suchvolumen ist hier nicht enthalten.",
+            "hinweis": hinweis,
         }
 
     except Exception as e:
-        # Fallback ohne Trends
+        # Fallback ohne Trends (Cache-Treffer bleiben erhalten, zählen aber
+        # nur als "verfügbar", wenn wirklich alle Keywords aus dem Cache kamen)
         return {
-            "trends_verfuegbar": False,
-            "ergebnisse": [
-                {
-                    "keyword": k,
-                    "trend_index": None,
-                    "suchvolumen": None,
-                    "verwandte_suchanfragen": [],
-                }
-                for k in cleaned
-            ],
+            "trends_verfuegbar": not fehlend,
+            "ergebnisse": [_gekuerzt(treffer.get(k) or _leeres_ergebnis(k)) for k in cleaned],
             "hinweis": f"Trends-Abfrage nicht verfügbar (pytrends Fehler): {str(e)}",
         }
\ No newline at end of file